@@ -1,28 +1,43 @@
 import os
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from .routers import health, files
 
-app = FastAPI(title="Kaplan LMS Builder API")
+# orjson serializes the big /tree item lists several times faster than stdlib json
+app = FastAPI(title="Kaplan LMS Builder API", default_response_class=ORJSONResponse)
 
-ALLOWED_ORIGINS = [
-    "http://localhost:5173",                                  # local Vite dev
-    "https://anthonyrajuv-dot.github.io",                     # GitHub Pages domain
-    "https://anthonyrajuv-dot.github.io/Kaplan-Authoring"     # (often not needed, but fine)
-]
+# Resolved once at startup; defaults cover local Vite dev and GitHub Pages.
+ALLOWED_ORIGINS = tuple(
+    o.strip()
+    for o in os.getenv(
+        "CORS_ALLOW_ORIGINS",
+        "http://localhost:5173,https://anthonyrajuv-dot.github.io",
+    ).split(",")
+    if o.strip()
+)
 
-origins = os.getenv("CORS_ALLOW_ORIGINS", "http://localhost:5173").split(",")
+# The browser only speaks plain HTTP verbs to this API (WebDAV verbs are
+# server-side); explicit lists let CORSMiddleware precompute its preflight
+# headers instead of reflecting them per request.
 app.add_middleware(
     CORSMiddleware,
     allow_origins=ALLOWED_ORIGINS,
     allow_credentials=True,          # set False if you never use cookies/auth
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=("GET", "POST", "PUT", "DELETE", "OPTIONS"),
+    allow_headers=("content-type", "x-lock-token", "authorization"),
+    max_age=600,                     # browsers cache preflight results
 )
 
 app.include_router(health.router, prefix="/api")
 app.include_router(files.router,  prefix="/api")
 
+# release the shared Alfresco connection pools cleanly
+@app.on_event("shutdown")
+async def _close_http_pools():
+    files._HTTP.close()
+    await files._AHTTP.aclose()
+
 @app.get("/healthz")
 def healthz(): return {"ok": True}
 
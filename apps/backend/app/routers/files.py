@@ -1,16 +1,21 @@
 from fastapi import APIRouter, HTTPException, Query, Body
-from fastapi.responses import PlainTextResponse
+from fastapi.responses import ORJSONResponse, PlainTextResponse
 from fastapi.responses import StreamingResponse
 from fastapi import Request
-import io, zipfile, uuid, datetime as dt
+import asyncio
+import codecs
+import io, time, zipfile, uuid, datetime as dt
 from lxml import etree as ET2
-import os, httpx, urllib.parse, xml.etree.ElementTree as ET
+from xml.sax import saxutils
+from functools import lru_cache
+import os, httpx, urllib.parse
 import json
 
 BASE = os.getenv("ALFRESCO_WEBDAV_BASE", "").rstrip("/")
 if not BASE:
     raise RuntimeError("ALFRESCO_WEBDAV_BASE not set")
 
+@lru_cache(maxsize=1)
 def _auth():
     u = os.getenv("ALFRESCO_USERNAME")
     p = os.getenv("ALFRESCO_PASSWORD")
@@ -18,63 +23,125 @@ def _auth():
         raise RuntimeError("ALFRESCO_USERNAME/ALFRESCO_PASSWORD not set")
     return (u, p)
 
-def _client():
-    return httpx.Client(auth=_auth(), timeout=30.0, follow_redirects=True)
+# Shared clients with keep-alive pools: Alfresco TCP+TLS handshakes are paid
+# once per pooled connection instead of once per API call. Closed via the app
+# shutdown handlers registered in main.py.
+_LIMITS = httpx.Limits(max_keepalive_connections=32, max_connections=64)
+_HTTP = httpx.Client(auth=_auth(), timeout=30.0, follow_redirects=True, limits=_LIMITS)
+_AHTTP = httpx.AsyncClient(auth=_auth(), timeout=30.0, follow_redirects=True, limits=_LIMITS)
 
-def _join(path: str):
-    return f"{BASE}/{path.lstrip('/')}"
+@lru_cache(maxsize=4096)
+def _join(path: str) -> str:
+    # BASE is constant, so joined URLs are pure in path; tree traversal hits
+    # the same prefixes over and over
+    return BASE + '/' + path.lstrip('/')
 
-def _normalize_href(href: str) -> str:
-    # Convert to repo-relative path after /documentLibrary/, strip leading/trailing slashes
-    rel = href.split('/documentLibrary/', 1)[-1] if '/documentLibrary/' in href else href
-    return rel.lstrip('/').rstrip('/')
-
-def _parse_propfind(xml_text: str, current_url: str):
-    NS = {'d': 'DAV:'}
-    root = ET.fromstring(xml_text)
+_DOCLIB = '/documentLibrary/'
+_unquote = urllib.parse.unquote  # bound once; looked up per PROPFIND entry
 
+def _normalize_href(href: str) -> str:
+    # Convert to repo-relative path after /documentLibrary/, strip leading/trailing slashes.
+    # Called once per PROPFIND entry, so scan for the marker only once.
+    i = href.find(_DOCLIB)
+    rel = href[i + len(_DOCLIB):] if i >= 0 else href
+    return rel.strip('/')
+
+def _propfind_item(resp, cur_norm: str):
+    # Extract one {name, path, isDir} dict from a DAV:response element,
+    # or None for rows we skip (self row, documentLibrary root, no props).
+    href_el = resp.find('{DAV:}href')
+    if href_el is None:
+        return None
+
+    raw = href_el.text or ''
+    # most hrefs carry no percent-escapes; skip the decode scan entirely then
+    href = _unquote(raw) if '%' in raw else raw
+    href_norm = href[:-1] if href.endswith('/') else href
+
+    # 1) Skip the container itself (self row)
+    if href_norm == cur_norm:
+        return None
+
+    # 2) Compute repo-relative path; skip empty (the documentLibrary root)
+    rel = _normalize_href(href)
+    if rel == "":
+        # Alfresco sometimes returns /documentLibrary as a child of itself — drop it
+        return None
+
+    prop = resp.find('{DAV:}propstat/{DAV:}prop')
+    if prop is None:
+        return None
+
+    is_dir = prop.find('{DAV:}resourcetype/{DAV:}collection') is not None
+    displayname = prop.find('{DAV:}displayname')
+    name = (displayname.text if displayname is not None else rel.split('/')[-1]) or rel
+
+    return {'name': name, 'path': rel, 'isDir': bool(is_dir)}
+
+def _iter_responses(xml_bytes: bytes):
+    # Stream DAV:response elements one at a time; clearing each element (and
+    # its already-seen siblings) keeps memory at ~one response regardless of
+    # how many entries a Depth:infinity PROPFIND returns.
+    for _, resp in ET2.iterparse(io.BytesIO(xml_bytes), events=('end',), tag='{DAV:}response'):
+        yield resp
+        resp.clear()
+        while resp.getprevious() is not None:
+            del resp.getparent()[0]
+
+def _parse_propfind(xml_bytes: bytes, current_url: str):
     # Normalize current URL once (no trailing slash) for self-skip
     cur_norm = current_url[:-1] if current_url.endswith('/') else current_url
 
     seen = set()
     items = []
-    for resp in root.findall('d:response', NS):
-        href_el = resp.find('d:href', NS)
-        if href_el is None:
-            continue
-
-        href = urllib.parse.unquote(href_el.text or '')
-        href_norm = href[:-1] if href.endswith('/') else href
-
-        # 1) Skip the container itself (self row)
-        if href_norm == cur_norm:
-            continue
-
-        # 2) Compute repo-relative path; skip empty (the documentLibrary root)
-        rel = _normalize_href(href)
-        if rel == "":
-            # Alfresco sometimes returns /documentLibrary as a child of itself — drop it
+    for resp in _iter_responses(xml_bytes):
+        item = _propfind_item(resp, cur_norm)
+        if item is None:
             continue
-
-        prop = resp.find('d:propstat/d:prop', NS)
-        if prop is None:
-            continue
-
-        is_dir = prop.find('d:resourcetype/d:collection', NS) is not None
-        displayname = prop.find('d:displayname', NS)
-        name = (displayname.text if displayname is not None else rel.split('/')[-1]) or rel
-
-        key = (rel, is_dir)
+        key = (item['path'], item['isDir'])
         if key in seen:
             continue
         seen.add(key)
-
-        items.append({'name': name, 'path': rel, 'isDir': bool(is_dir)})
+        items.append(item)
 
     # Folders first, alphabetical
     items.sort(key=lambda x: (not x['isDir'], x['name'].lower()))
     return items
 
+# Folders recently confirmed to exist (by probe or our own MKCOL walk),
+# keyed by repo-relative path with the confirmation time. Saving into an
+# existing folder — the common case — then costs one PROPFIND at most.
+_FOLDER_CACHE: dict[str, float] = {}
+_FOLDER_TTL = 60.0
+
+def _folder_exists(path: str) -> bool:
+    ts = _FOLDER_CACHE.get(path)
+    if ts is not None and time.time() - ts < _FOLDER_TTL:
+        return True
+    r = _HTTP.request("PROPFIND", _join(path), headers={"Depth": "0"})
+    if r.status_code < 400:
+        _FOLDER_CACHE[path] = time.time()
+        return True
+    return False
+
+def _forget_folder(path: str):
+    # Drop cached existence for path and everything under it (DELETE/MOVE).
+    p = path.strip("/")
+    for key in [k for k in _FOLDER_CACHE if k == p or k.startswith(p + "/")]:
+        del _FOLDER_CACHE[key]
+
+# Parsed /tree listings keyed by repo-relative path: (etag, fetched-at,
+# items). Fresh entries are revalidated with If-None-Match so an unchanged
+# folder costs a 304 + dict lookup instead of a full multistatus parse.
+_TREE_CACHE: dict[str, tuple[str | None, float, list]] = {}
+_TREE_TTL = 30.0
+
+def _forget_tree(path: str):
+    # Drop the listing for path and for its parent (whose children changed).
+    p = path.strip("/")
+    _TREE_CACHE.pop(p, None)
+    _TREE_CACHE.pop(p.rsplit("/", 1)[0] if "/" in p else "", None)
+
 router = APIRouter(prefix="/files", tags=["files"])
 
 @router.get("/base")
@@ -85,25 +152,79 @@ def base():
 @router.get("/tree")
 def tree(path: str = Query(default='')):
     url = _join(path)
-    with _client() as c:
-        r = c.request("PROPFIND", url, headers={"Depth": "1"})
-        if r.status_code >= 400:
-            raise HTTPException(r.status_code, r.text)
-        base_norm = url[:-1] if url.endswith('/') else url
-        return _parse_propfind(r.text, base_norm)
+    key = path.strip('/')
+    now = time.time()
+    cached = _TREE_CACHE.get(key)
+    if cached is not None and now - cached[1] >= _TREE_TTL:
+        cached = None
+    headers = {"Depth": "1"}
+    if cached is not None and cached[0]:
+        headers["If-None-Match"] = cached[0]
+    r = _HTTP.request("PROPFIND", url, headers=headers)
+    if r.status_code == 304 and cached is not None:
+        return cached[2]
+    if r.status_code >= 400:
+        raise HTTPException(r.status_code, r.text)
+    base_norm = url[:-1] if url.endswith('/') else url
+    items = _parse_propfind(r.content, base_norm)
+    _TREE_CACHE[key] = (r.headers.get("etag"), now, items)
+    return items
+
+# Extensions we trust to be text; these stream straight through without
+# buffering the whole file for the UTF-8 check.
+_TEXT_EXTS = {".xml", ".dita", ".ditamap", ".md", ".json", ".txt", ".html", ".svg", ".css", ".js"}
 
 @router.get("/content", response_class=PlainTextResponse)
-def content(path: str):
+async def content(path: str):
     url = _join(path)
-    with _client() as c:
-        r = c.get(url)
+    if os.path.splitext(path)[1].lower() in _TEXT_EXTS:
+        r = await _AHTTP.send(_AHTTP.build_request("GET", url), stream=True)
         if r.status_code >= 400:
-            raise HTTPException(r.status_code, r.text)
+            detail = (await r.aread()).decode("utf-8", errors="replace")
+            await r.aclose()
+            raise HTTPException(r.status_code, detail)
+
+        # Strict incremental decode: chunks flow out as they arrive, never
+        # the whole document as one string. The first chunk is decoded
+        # before the stream starts so a non-UTF-8 file behind a text
+        # extension still gets the binary sentinel, not mangled replacement
+        # characters the editor would save back.
+        decode = codecs.getincrementaldecoder("utf-8")().decode
+        chunks = r.aiter_bytes(65536)
         try:
-            return r.content.decode('utf-8')
+            head = decode(await anext(chunks, b""))
         except UnicodeDecodeError:
+            await r.aclose()
             return "<<BINARY CONTENT (not UTF-8)>>"
 
+        async def gen():
+            try:
+                if head:
+                    yield head
+                async for chunk in chunks:
+                    s = decode(chunk)
+                    if s:
+                        yield s
+                tail = decode(b"", True)
+                if tail:
+                    yield tail
+            finally:
+                await r.aclose()
+
+        return StreamingResponse(gen(), media_type="text/plain; charset=utf-8")
+
+    r = await _AHTTP.get(url)
+    if r.status_code >= 400:
+        raise HTTPException(r.status_code, r.text)
+    # NUL in the first 4KB means binary (images, PDFs, ...): bail out before
+    # paying a full-document decode just to hit UnicodeDecodeError
+    if b'\x00' in r.content[:4096]:
+        return "<<BINARY CONTENT (not UTF-8)>>"
+    try:
+        return r.content.decode('utf-8')
+    except UnicodeDecodeError:
+        return "<<BINARY CONTENT (not UTF-8)>>"
+
 @router.put("/content")
 async def save(path: str, request: Request):
     """
@@ -111,14 +232,17 @@ async def save(path: str, request: Request):
     Accepts empty body.
     Respects WebDAV lock token if provided via 'X-Lock-Token' header.
     """
-    # ensure parent folders exist
+    # ensure parent folders exist; probe the deepest parent first so the
+    # common case (folder already there) is one round-trip, not one per level
     parts = path.strip("/").split("/")
     if len(parts) > 1:
-        cur = ""
-        with _client() as c:
+        parent = "/".join(parts[:-1])
+        if not _folder_exists(parent):
+            cur = ""
             for p in parts[:-1]:
                 cur = f"{cur}/{p}" if cur else p
-                c.request("MKCOL", _join(cur))  # 201 or 405 is fine
+                _HTTP.request("MKCOL", _join(cur))  # 201 or 405 is fine
+            _FOLDER_CACHE[parent] = time.time()
 
     data = await request.body()
     content_type = request.headers.get("content-type", "application/octet-stream")
@@ -129,55 +253,59 @@ async def save(path: str, request: Request):
         # WebDAV expects 'If' header with token like (<opaquelocktoken:...>)
         headers["If"] = f"(<{token}>)"
 
-    with _client() as c:
-        r = c.put(_join(path), content=data, headers=headers)
-        if r.status_code >= 400:
-            raise HTTPException(r.status_code, r.text)
-        return {"ok": True}
+    r = _HTTP.put(_join(path), content=data, headers=headers)
+    if r.status_code >= 400:
+        raise HTTPException(r.status_code, r.text)
+    _forget_tree(path)
+    return {"ok": True}
 
 
 
 @router.post("/mkdir")
 def mkdir(path: str):
     url = _join(path)
-    with _client() as c:
-        r = c.request("MKCOL", url)
-        if r.status_code in (201, 405, 200, 301, 302):
-            return {"ok": True}
-        raise HTTPException(r.status_code, r.text)
+    r = _HTTP.request("MKCOL", url)
+    if r.status_code in (201, 405, 200, 301, 302):
+        _FOLDER_CACHE[path.strip("/")] = time.time()
+        _forget_tree(path)
+        return {"ok": True}
+    raise HTTPException(r.status_code, r.text)
 
 @router.delete("")
 def delete(path: str = Query(...)):
     url = _join(path)
-    with _client() as c:
-        r = c.delete(url)
-        if r.status_code in (200, 204):
-            return {"ok": True}
-        if r.status_code == 404:
-            raise HTTPException(404, "Not found")
-        raise HTTPException(r.status_code, r.text)
+    r = _HTTP.delete(url)
+    if r.status_code in (200, 204):
+        _forget_folder(path)
+        _forget_tree(path)
+        return {"ok": True}
+    if r.status_code == 404:
+        raise HTTPException(404, "Not found")
+    raise HTTPException(r.status_code, r.text)
 
 @router.post("/move")
 def move(src: str = Body(...), dst: str = Body(...)):
     """WebDAV MOVE (rename or move)."""
     src_url = _join(src)
     dst_url = _join(dst)
-    with _client() as c:
-        r = c.request("MOVE", src_url, headers={"Destination": dst_url, "Overwrite": "T"})
-        if r.status_code in (201, 204):
-            return {"ok": True}
-        raise HTTPException(r.status_code, r.text)
+    r = _HTTP.request("MOVE", src_url, headers={"Destination": dst_url, "Overwrite": "T"})
+    if r.status_code in (201, 204):
+        _forget_folder(src)
+        _forget_tree(src)
+        _forget_tree(dst)
+        return {"ok": True}
+    raise HTTPException(r.status_code, r.text)
 
 @router.post("/copy")
 def copy(src: str = Body(...), dst: str = Body(...)):
     """WebDAV COPY."""
     src_url = _join(src)
     dst_url = _join(dst)
-    with _client() as c:
-        r = c.request("COPY", src_url, headers={"Destination": dst_url, "Overwrite": "T"})
-        if r.status_code in (201, 204):
-            return {"ok": True}
-        raise HTTPException(r.status_code, r.text)
+    r = _HTTP.request("COPY", src_url, headers={"Destination": dst_url, "Overwrite": "T"})
+    if r.status_code in (201, 204):
+        _forget_tree(dst)
+        return {"ok": True}
+    raise HTTPException(r.status_code, r.text)
 
 @router.post("/format/xml")
 async def format_xml(request: Request):
@@ -195,19 +323,30 @@ async def format_xml(request: Request):
         raise HTTPException(400, f"XML parse/format error: {e}")
 
 
-DITA_ROOTS = {"topic","concept","task","reference","glossentry","map","bookmap"}
+DITA_ROOTS = frozenset({"topic","concept","task","reference","glossentry","map","bookmap"})
 DITA_NS_URIS = {
     "http://dita.oasis-open.org/architecture/2005/",
     "http://dita.oasis-open.org/architecture/2005/dita",
     "urn:oasis:names:tc:dita:x:y",  # permissive catch
 }
 
+# Relaxed structural schema for the DITA roots above, compiled once at
+# import; per-request validation is then a single C-level pass.
+_DITA_SCHEMA = ET2.RelaxNG(ET2.parse(os.path.join(os.path.dirname(__file__), "dita-min.rng")))
+
+# XPath expressions compiled once at import; the local-name() predicates in
+# particular are costly to recompile per request.
+_ACTIVELOCK_XPATH = ET2.XPath("//*[local-name()='activelock']")
+_OWNER_XPATH = ET2.XPath("//*[local-name()='activelock']/*[local-name()='owner']")
+_TOKEN_XPATH = ET2.XPath("//*[local-name()='locktoken']/*[local-name()='href']")
+
 @router.post("/validate/dita")
 async def validate_dita(request: Request):
     """
     Lightweight DITA validation:
     - Well-formed XML
     - Root element looks like a known DITA type (topic/task/map/...)
+    - Relaxed structural check (e.g. topic-family roots need a <title>)
     - Warn if no @id on root
     Returns: { ok: bool, errors: [..], warnings: [..], root: 'task', ns: '...' }
     """
@@ -217,7 +356,7 @@ async def validate_dita(request: Request):
         parser = ET2.XMLParser(recover=False)
         root = ET2.fromstring(data, parser=parser)
     except ET2.XMLSyntaxError as e:
-        return JSONResponse({"ok": False, "errors": [str(e)], "warnings": []})
+        return ORJSONResponse({"ok": False, "errors": [str(e)], "warnings": []})
 
     tag = ET2.QName(root.tag)
     root_local = tag.localname
@@ -232,92 +371,160 @@ async def validate_dita(request: Request):
     if not root.get("id"):
         warnings.append("Root element has no @id.")
 
-    # Quick link checks (common authoring pitfall)
-    for el in root.xpath(".//*[@href]"):
-        href = el.get("href") or ""
-        if href.strip() == "":
+    # Structural check against the precompiled relaxed schema (no-namespace
+    # DITA only; namespaced or unknown roots are already flagged above)
+    if root_local in DITA_ROOTS and not ns:
+        if not _DITA_SCHEMA.validate(root):
+            # libxml2 sometimes fails RelaxNG validation without log entries
+            msgs = [str(e.message) for e in _DITA_SCHEMA.error_log]
+            errors.extend(msgs or [f"<{root_local}> does not match the relaxed DITA schema (missing <title>?)."])
+
+    # Quick link checks (common authoring pitfall); root.iter() walks the
+    # tree in C without materializing an XPath result list
+    for el in root.iter():
+        href = el.get("href")
+        if href is not None and not href.strip():
             warnings.append("Empty @href attribute found.")
 
-    return JSONResponse({"ok": len(errors) == 0, "errors": errors, "warnings": warnings, "root": root_local, "ns": ns})
+    return ORJSONResponse({"ok": len(errors) == 0, "errors": errors, "warnings": warnings, "root": root_local, "ns": ns})
 
 
 @router.get("/download")
-def download(path: str):
-    with _client() as c:
-        r = c.get(_join(path))
-        if r.status_code >= 400: raise HTTPException(r.status_code, r.text)
-        filename = path.split("/")[-1] or "download"
-        return StreamingResponse(io.BytesIO(r.content),
-            media_type=r.headers.get("Content-Type","application/octet-stream"),
-            headers={"Content-Disposition": f"attachment; filename={filename}"})
+async def download(path: str):
+    # Open the Alfresco response as a stream and relay it chunk by chunk;
+    # first byte reaches the browser after one upstream RTT and the file is
+    # never held in memory whole.
+    r = await _AHTTP.send(_AHTTP.build_request("GET", _join(path)), stream=True)
+    if r.status_code >= 400:
+        detail = (await r.aread()).decode("utf-8", errors="replace")
+        await r.aclose()
+        raise HTTPException(r.status_code, detail)
+    filename = path.split("/")[-1] or "download"
+
+    async def gen():
+        try:
+            async for chunk in r.aiter_bytes(65536):
+                yield chunk
+        finally:
+            await r.aclose()
 
-@router.get("/zip")
-def zip_folder(path: str):
-    # Depth: infinity PROPFIND; then GET each file into a zip
-    with _client() as c:
-        pr = c.request("PROPFIND", _join(path), headers={"Depth":"infinity"})
-        if pr.status_code >= 400: raise HTTPException(pr.status_code, pr.text)
-        # reuse existing normalizer
-        hrefs = []
-        root = ET.fromstring(pr.text)
-        NS = {'d':'DAV:'}
-        base = _join(path)
-        base_norm = base[:-1] if base.endswith('/') else base
-        for resp in root.findall('d:response', NS):
-            href_el = resp.find('d:href', NS)
-            if href_el is None: continue
-            href = urllib.parse.unquote(href_el.text or '')
-            if href.rstrip('/') == base_norm:  # skip folder itself
-                continue
-            prop = resp.find('d:propstat/d:prop', NS)
-            if prop is None: continue
-            is_dir = prop.find('d:resourcetype/d:collection', NS) is not None
-            if is_dir: continue
-            rel = _normalize_href(href)  # repo-relative path
-            hrefs.append(rel)
-
-        buf = io.BytesIO()
-        with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as z:
-            for rel in hrefs:
-                gr = c.get(_join(rel))
-                if gr.status_code == 200:
-                    # store path inside zip relative to selected folder
-                    inner = rel[len(path.strip("/"))+1:] if rel.startswith(path.strip("/")+"/") else rel
-                    z.writestr(inner, gr.content)
-        buf.seek(0)
-        name = (path.split("/")[-1] or "export") + ".zip"
-        return StreamingResponse(buf, media_type="application/zip",
-            headers={"Content-Disposition": f"attachment; filename={name}"})
+    return StreamingResponse(gen(),
+        media_type=r.headers.get("Content-Type","application/octet-stream"),
+        headers={"Content-Disposition": f"attachment; filename={filename}"})
 
-@router.delete("")
-def delete(path: str = Query(...)):
-    with _client() as c:
-        r = c.delete(_join(path))
-        if r.status_code in (200,204): return {"ok": True}
-        if r.status_code == 404: raise HTTPException(404, "Not found")
-        raise HTTPException(r.status_code, r.text)
+class _PipeBuffer:
+    """Write-only sink for ZipFile; drain() hands accumulated bytes to the response."""
+    def __init__(self):
+        self._chunks = []
 
-@router.post("/move")
-def move(src: str = Body(...), dst: str = Body(...)):
-    with _client() as c:
-        r = c.request("MOVE", _join(src), headers={"Destination": _join(dst), "Overwrite":"T"})
-        if r.status_code in (201,204): return {"ok": True}
-        raise HTTPException(r.status_code, r.text)
+    def write(self, b):
+        self._chunks.append(b)
+        return len(b)
 
-@router.post("/copy")
-def copy(src: str = Body(...), dst: str = Body(...)):
-    with _client() as c:
-        r = c.request("COPY", _join(src), headers={"Destination": _join(dst), "Overwrite":"T"})
-        if r.status_code in (201,204): return {"ok": True}
-        raise HTTPException(r.status_code, r.text)
+    def flush(self):
+        pass
 
-def _owner_xml(owner: str) -> str:
-    return f"""<?xml version="1.0" encoding="utf-8" ?>
-<D:lockinfo xmlns:D="DAV:">
-  <D:lockscope><D:exclusive/></D:lockscope>
-  <D:locktype><D:write/></D:locktype>
-  <D:owner>{owner}</D:owner>
-</D:lockinfo>"""
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+@router.get("/zip")
+async def zip_folder(path: str):
+    # Depth: infinity PROPFIND; then GET each file into a zip
+    pr = await _AHTTP.request("PROPFIND", _join(path), headers={"Depth":"infinity"})
+    if pr.status_code >= 400: raise HTTPException(pr.status_code, pr.text)
+    # reuse existing normalizer
+    hrefs = []
+    base = _join(path)
+    base_norm = base[:-1] if base.endswith('/') else base
+    for resp in _iter_responses(pr.content):
+        item = _propfind_item(resp, base_norm)
+        if item is None or item['isDir']:
+            continue
+        hrefs.append(item['path'])
+
+    prefix = path.strip("/") + "/"
+
+    async def gen():
+        # Open up to 8 file streams concurrently over keep-alive connections
+        # and zip them into the response in completion order: each file is
+        # copied chunk by chunk from the Alfresco stream into the zip entry,
+        # so no file is ever held in memory whole and the client sees data
+        # after the first chunk instead of after the whole archive is built.
+        pipe = _PipeBuffer()
+        sem = asyncio.Semaphore(8)
+        queue: asyncio.Queue = asyncio.Queue(maxsize=8)
+
+        async def fetch(rel):
+            async with sem:
+                try:
+                    r = await _AHTTP.send(_AHTTP.build_request("GET", _join(rel)), stream=True)
+                except Exception as exc:
+                    # the consumer expects one queue item per task; deliver
+                    # the failure so it never waits on a put that won't come
+                    await queue.put((rel, exc))
+                    return
+                await queue.put((rel, r))
+
+        tasks = [asyncio.ensure_future(fetch(rel)) for rel in hrefs]
+        try:
+            with zipfile.ZipFile(pipe, "w", zipfile.ZIP_DEFLATED) as z:
+                for _ in tasks:
+                    rel, gr = await queue.get()
+                    if isinstance(gr, Exception):
+                        raise gr
+                    if gr.status_code != 200:
+                        await gr.aclose()
+                        continue
+                    # store path inside zip relative to selected folder
+                    inner = rel[len(prefix):] if rel.startswith(prefix) else rel
+                    zi = zipfile.ZipInfo(inner, date_time=time.localtime()[:6])
+                    zi.compress_type = zipfile.ZIP_DEFLATED
+                    try:
+                        with z.open(zi, "w", force_zip64=True) as zf:
+                            async for chunk in gr.aiter_bytes(65536):
+                                zf.write(chunk)
+                                piece = pipe.drain()
+                                if piece:
+                                    yield piece
+                    finally:
+                        await gr.aclose()
+                    chunk = pipe.drain()
+                    if chunk:
+                        yield chunk
+            # central directory written on ZipFile close
+            yield pipe.drain()
+            await asyncio.gather(*tasks)
+        finally:
+            for t in tasks:
+                t.cancel()
+            while not queue.empty():
+                _, gr = queue.get_nowait()
+                if not isinstance(gr, Exception):
+                    await gr.aclose()
+
+    name = (path.split("/")[-1] or "export") + ".zip"
+    return StreamingResponse(gen(), media_type="application/zip",
+        headers={"Content-Disposition": f"attachment; filename={name}"})
+
+# DAV request payloads built once; only the owner varies per /lock call.
+_LOCK_XML_FMT = (
+    b'<?xml version="1.0" encoding="utf-8" ?>'
+    b'<D:lockinfo xmlns:D="DAV:">'
+    b'<D:lockscope><D:exclusive/></D:lockscope>'
+    b'<D:locktype><D:write/></D:locktype>'
+    b'<D:owner>%s</D:owner>'
+    b'</D:lockinfo>'
+)
+_LOCKDISCOVERY_PROPFIND = (
+    b'<?xml version="1.0" encoding="utf-8"?>'
+    b'<D:propfind xmlns:D="DAV:"><D:prop><D:lockdiscovery/></D:prop></D:propfind>'
+)
+
+def _owner_xml(owner: str) -> bytes:
+    # owner is caller-supplied: escape it so it cannot break out of the element
+    return _LOCK_XML_FMT % saxutils.escape(owner).encode("utf-8", "xmlcharrefreplace")
 
 @router.post("/lock")
 def lock(path: str, owner: str = "unknown", timeout_seconds: int = 1800):
@@ -325,26 +532,25 @@ def lock(path: str, owner: str = "unknown", timeout_seconds: int = 1800):
     Request an exclusive write LOCK.
     Returns { token, owner, timeout }.
     """
-    with _client() as c:
-        r = c.request(
-            "LOCK",
-            _join(path),
-            headers={"Timeout": f"Second-{timeout_seconds}", "Content-Type": "text/xml"},
-            content=_owner_xml(owner).encode("utf-8"),
-        )
-        if r.status_code in (200, 201):
-            # Extract token from response lockdiscovery
-            try:
-                root = ET2.fromstring(r.text.encode("utf-8"))
-                token = root.xpath("//*[local-name()='locktoken']/*[local-name()='href']")[0].text
-            except Exception:
-                # Fallback: some servers return Lock-Token header
-                token = r.headers.get("Lock-Token", "").strip("<>")
-            return {"token": token, "owner": owner, "timeout": timeout_seconds}
-        elif r.status_code == 423:
-            raise HTTPException(423, "Resource locked.")
-        else:
-            raise HTTPException(r.status_code, r.text)
+    r = _HTTP.request(
+        "LOCK",
+        _join(path),
+        headers={"Timeout": f"Second-{timeout_seconds}", "Content-Type": "text/xml"},
+        content=_owner_xml(owner),
+    )
+    if r.status_code in (200, 201):
+        # Extract token from response lockdiscovery
+        try:
+            root = ET2.fromstring(r.text.encode("utf-8"))
+            token = _TOKEN_XPATH(root)[0].text
+        except Exception:
+            # Fallback: some servers return Lock-Token header
+            token = r.headers.get("Lock-Token", "").strip("<>")
+        return {"token": token, "owner": owner, "timeout": timeout_seconds}
+    elif r.status_code == 423:
+        raise HTTPException(423, "Resource locked.")
+    else:
+        raise HTTPException(r.status_code, r.text)
 
 @router.post("/unlock")
 async def unlock(path: str, request: Request, token: str | None = None):
@@ -383,11 +589,10 @@ async def unlock(path: str, request: Request, token: str | None = None):
         # Some servers already send the full schema; if not, assume it's the opaque token
         token_clean = f"opaquelocktoken:{token_clean}"
 
-    with _client() as c:
-        r = c.request("UNLOCK", _join(path), headers={"Lock-Token": f"<{token_clean}>"})
-        if r.status_code in (204, 200):
-            return {"ok": True}
-        raise HTTPException(r.status_code, r.text)
+    r = _HTTP.request("UNLOCK", _join(path), headers={"Lock-Token": f"<{token_clean}>"})
+    if r.status_code in (204, 200):
+        return {"ok": True}
+    raise HTTPException(r.status_code, r.text)
 
 
 @router.get("/lockinfo")
@@ -395,22 +600,20 @@ def lockinfo(path: str):
     """
     Return active lock info if any: { locked: bool, owner: str|None, token: str|None }
     """
-    with _client() as c:
-        r = c.request("PROPFIND", _join(path), headers={"Depth": "0",
-            "Content-Type": "text/xml"}, content=b"""<?xml version="1.0" encoding="utf-8"?>
-<D:propfind xmlns:D="DAV:"><D:prop><D:lockdiscovery/></D:prop></D:propfind>""")
-        if r.status_code >= 400:
-            raise HTTPException(r.status_code, r.text)
-        root = ET2.fromstring(r.text.encode("utf-8"))
-        active = root.xpath("//*[local-name()='activelock']")
-        if not active:
-            return {"locked": False, "owner": None, "token": None}
-        owner = None
-        owner_el = root.xpath("//*[local-name()='activelock']/*[local-name()='owner']")
-        if owner_el:
-            owner = "".join(owner_el[0].itertext()).strip()
-        token = None
-        token_el = root.xpath("//*[local-name()='activelock']/*[local-name()='locktoken']/*[local-name()='href']")
-        if token_el:
-            token = token_el[0].text.strip("<>")
-        return {"locked": True, "owner": owner, "token": token}
+    r = _HTTP.request("PROPFIND", _join(path), headers={"Depth": "0",
+        "Content-Type": "text/xml"}, content=_LOCKDISCOVERY_PROPFIND)
+    if r.status_code >= 400:
+        raise HTTPException(r.status_code, r.text)
+    root = ET2.fromstring(r.text.encode("utf-8"))
+    active = _ACTIVELOCK_XPATH(root)
+    if not active:
+        return {"locked": False, "owner": None, "token": None}
+    owner = None
+    owner_el = _OWNER_XPATH(root)
+    if owner_el:
+        owner = "".join(owner_el[0].itertext()).strip()
+    token = None
+    token_el = _TOKEN_XPATH(root)
+    if token_el:
+        token = token_el[0].text.strip("<>")
+    return {"locked": True, "owner": owner, "token": token}